@@ -0,0 +1,377 @@
+"""Test de charge local : N sessions Streamlit simulées en parallèle (AppTest).
+
+Chaque session est un thread qui exécute `app.py` et les deux pages en mode
+headless, en envoyant des changements de filtres aléatoires au dashboard.
+Toutes les sessions partagent le même processus, donc les mêmes caches
+`st.cache_data` / `st.cache_resource`, comme sur un serveur réel.
+
+    python load_test.py --sessions 20 --reruns 30
+    python load_test.py --sessions 50 --reruns 10 --seed 1 --json resultats.json
+
+Rapport : percentiles de latence par page (ms), RSS max du processus, taux
+de succès des caches Streamlit par fonction et compteurs du `DatasetStore`
+(le chemin des données du dashboard ne passe plus par `st.cache_*`).
+"""
+
+import argparse
+import ast
+import contextlib
+import json
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from streamlit.runtime.caching.cache_utils import CachedFunc
+from streamlit.runtime.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import patch_config_options
+
+from transport_data import DatasetStore
+
+BASE_DIR = Path(__file__).resolve().parent
+HOME_PAGE = "app.py"
+DASHBOARD_PAGE = "pages/1_Dashboard_transport.py"
+CV_PAGE = "pages/2_CV_Portfolio.py"
+
+# Répartition du trafic entre les pages (le dashboard est le plus coûteux)
+PAGE_WEIGHTS = {HOME_PAGE: 1, DASHBOARD_PAGE: 6, CV_PAGE: 3}
+
+# Les pages importent des modules à la racine (transport_data, ...)
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+
+# =============== INSTRUMENTATION DES CACHES ===============
+
+
+class CacheCounter:
+    """Compte appels et calculs effectifs des fonctions `st.cache_*`.
+
+    On ne compte pas les lectures du cache : sur un échec, Streamlit relit
+    l'entrée une seconde fois sous verrou (double-checked locking), ce qui
+    compterait chaque calcul deux fois. Succès = appels - calculs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.computations = defaultdict(int)
+
+    @staticmethod
+    def _name(cached_func) -> str:
+        func = cached_func._info.func
+        return f"{func.__module__}.{func.__qualname__}"
+
+    @contextlib.contextmanager
+    def patch(self):
+        original_call = CachedFunc.__call__
+        original_store = CachedFunc._store_computed_value
+
+        def call(cached_func, *args, **kwargs):
+            with self.lock:
+                self.calls[self._name(cached_func)] += 1
+            return original_call(cached_func, *args, **kwargs)
+
+        def store(cached_func, *args, **kwargs):
+            # Appelé une seule fois par calcul réel de la fonction décorée
+            with self.lock:
+                self.computations[self._name(cached_func)] += 1
+            return original_store(cached_func, *args, **kwargs)
+
+        CachedFunc.__call__ = call
+        CachedFunc._store_computed_value = store
+        try:
+            yield self
+        finally:
+            CachedFunc.__call__ = original_call
+            CachedFunc._store_computed_value = original_store
+
+    def report(self) -> dict:
+        out = {}
+        for name in sorted(self.calls):
+            calls, misses = self.calls[name], self.computations[name]
+            out[name] = {
+                "hits": calls - misses,
+                "misses": misses,
+                "hit_rate": (calls - misses) / calls,
+            }
+        return out
+
+
+STORE_STATS = (
+    "refreshes",
+    "unchanged",
+    "publishes",
+    "partitions_reused",
+    "partitions_ingested_artifacts",
+    "partitions_ingested_csv",
+    "partitions_failed",
+)
+
+
+class StoreCounter:
+    """Cumule les compteurs (`stats`) des `DatasetStore` créés pendant la charge.
+
+    Le store est partagé via `st.cache_resource` : un seul doit être créé, et
+    une régression du cache des données se voit ici (partitions ré-ingérées,
+    snapshots republiés) même quand `CacheCounter` reste à 100 %.
+    """
+
+    def __init__(self):
+        self.stores = []
+
+    @contextlib.contextmanager
+    def patch(self):
+        original_init = DatasetStore.__init__
+
+        def init(store, *args, **kwargs):
+            original_init(store, *args, **kwargs)
+            self.stores.append(store)
+
+        DatasetStore.__init__ = init
+        try:
+            yield self
+        finally:
+            DatasetStore.__init__ = original_init
+
+    def report(self) -> dict:
+        out = {"instances": len(self.stores)}
+        for name in STORE_STATS:
+            out[name] = sum(store.stats[name] for store in self.stores)
+        return out
+
+
+@contextlib.contextmanager
+def shared_runtime():
+    """Rend AppTest utilisable par plusieurs threads pendant toute la charge.
+
+    AppTest installe un Runtime global et l'option `global.appTest` avant
+    chaque rerun, puis les retire à la fin : sans ce correctif, une session
+    qui termine les coupe aux sessions encore en cours d'exécution.
+    """
+    original_instance = Runtime.__dict__["instance"]
+    original_exists = Runtime.__dict__["exists"]
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+            return cls._instance
+        if "runtime" in last:
+            return last["runtime"]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    def exists(cls):
+        return cls._instance is not None or "runtime" in last
+
+    # AppTest reparse le script à chaque rerun ; ast.parse n'est pas sûr entre
+    # threads sous CPython 3.11 (gh-106905 : "AST constructor recursion depth")
+    original_parse = ast.parse
+    parse_lock = threading.Lock()
+
+    def parse(*args, **kwargs):
+        with parse_lock:
+            return original_parse(*args, **kwargs)
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    ast.parse = parse
+    try:
+        with patch_config_options({"global.appTest": True}):
+            yield
+    finally:
+        Runtime.instance = original_instance
+        Runtime.exists = original_exists
+        ast.parse = original_parse
+
+
+# =============== SESSIONS SIMULÉES ===============
+
+
+def _widget(at: AppTest, kind: str, label: str):
+    """Premier widget `kind` dont le libellé est `label` (None si absent)."""
+    for w in getattr(at, kind):
+        if w.label == label:
+            return w
+    return None
+
+
+def randomize_dashboard(at: AppTest, rng: random.Random) -> None:
+    """Applique 1 à 3 changements de filtres aléatoires sur le dashboard."""
+    actions = ["trimestre", "type_jour", "recherche", "gares", "heures", "export"]
+    for action in rng.sample(actions, rng.randint(1, 3)):
+        if action == "trimestre":
+            w = _widget(at, "selectbox", "Trimestre")
+            if w is not None:
+                w.set_value(rng.choice(w.options))
+        elif action == "type_jour":
+            w = _widget(at, "selectbox", "Type de jour")
+            if w is not None and w.options:
+                w.set_value(rng.choice(w.options))
+        elif action == "recherche":
+            w = _widget(at, "text_input", "Rechercher une gare")
+            picker = _widget(at, "multiselect", "Gares / stations à afficher")
+            if w is not None and picker is not None and picker.options:
+                name = rng.choice(list(picker.options))
+                w.set_value(name[: rng.randint(1, max(1, len(name)))])
+        elif action == "gares":
+            w = _widget(at, "multiselect", "Gares / stations à afficher")
+            if w is not None and w.options:
+                k = rng.randint(0, min(20, len(w.options)))
+                w.set_value(rng.sample(list(w.options), k))
+        elif action == "heures":
+            w = _widget(at, "slider", "Plage horaire (heures)")
+            if w is not None:
+                lo, hi = sorted(rng.sample(range(int(w.min), int(w.max) + 1), 2))
+                w.set_value((lo, hi))
+        elif action == "export":
+            w = _widget(at, "radio", "Format d'export")
+            if w is not None:
+                w.set_value(rng.choice(w.options))
+
+
+def run_session(
+    session_id: int, reruns: int, seed: int, timeout: float, latencies: dict, errors: list
+) -> None:
+    """Une session : `reruns` exécutions réparties aléatoirement entre les pages."""
+    rng = random.Random(seed * 100_003 + session_id)
+    apps = {}
+    pages, weights = zip(*PAGE_WEIGHTS.items())
+
+    for _ in range(reruns):
+        page = rng.choices(pages, weights)[0]
+        at = apps.get(page)
+        if at is None:
+            at = AppTest.from_file(str(BASE_DIR / page), default_timeout=timeout)
+            apps[page] = at
+        elif page == DASHBOARD_PAGE:
+            randomize_dashboard(at, rng)
+
+        start = time.perf_counter()
+        try:
+            at.run()
+        except Exception as exc:  # timeout AppTest, etc.
+            errors.append((session_id, page, repr(exc)))
+            apps.pop(page, None)
+            continue
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        latencies[page].append(elapsed_ms)
+        for exc in at.exception:
+            errors.append((session_id, page, exc.value))
+
+
+# =============== RAPPORT ===============
+
+
+def percentile(values: list, q: float) -> float:
+    """Percentile q (0–100) par interpolation linéaire."""
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    pos = (len(values) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss est en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_load_test(sessions: int, reruns: int, seed: int = 0, timeout: float = 120) -> dict:
+    """Lance la charge et retourne les mesures agrégées."""
+    latencies = defaultdict(list)
+    errors = []
+    counter = CacheCounter()
+    store_counter = StoreCounter()
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    with counter.patch(), store_counter.patch(), shared_runtime():
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            futures = [
+                pool.submit(run_session, i, reruns, seed, timeout, latencies, errors)
+                for i in range(sessions)
+            ]
+            for f in futures:
+                f.result()
+    wall_s = time.perf_counter() - start
+
+    pages = {}
+    for page, values in sorted(latencies.items()):
+        pages[page] = {
+            "reruns": len(values),
+            "p50_ms": percentile(values, 50),
+            "p90_ms": percentile(values, 90),
+            "p99_ms": percentile(values, 99),
+            "max_ms": max(values),
+            "mean_ms": statistics.fmean(values),
+        }
+    return {
+        "sessions": sessions,
+        "reruns_per_session": reruns,
+        "seed": seed,
+        "wall_s": wall_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_mb": rss_before,
+        "pages": pages,
+        "caches": counter.report(),
+        "store": store_counter.report(),
+        "errors": errors,
+    }
+
+
+def print_report(results: dict) -> None:
+    print(
+        f"{results['sessions']} sessions × {results['reruns_per_session']} reruns "
+        f"en {results['wall_s']:.1f} s — RSS max {results['peak_rss_mb']:.0f} Mo "
+        f"(avant charge : {results['rss_before_mb']:.0f} Mo)"
+    )
+    print()
+    print(f"{'Page':<34}{'n':>6}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    for page, s in results["pages"].items():
+        print(
+            f"{page:<34}{s['reruns']:>6}{s['p50_ms']:>10.0f}{s['p90_ms']:>10.0f}"
+            f"{s['p99_ms']:>10.0f}{s['max_ms']:>10.0f}"
+        )
+    print()
+    print(f"{'Cache':<34}{'hits':>8}{'misses':>8}{'taux':>8}")
+    for name, c in results["caches"].items():
+        print(f"{name:<34}{c['hits']:>8}{c['misses']:>8}{c['hit_rate']:>8.0%}")
+    print()
+    print(f"{'DatasetStore':<34}{'total':>8}")
+    for name, value in results["store"].items():
+        print(f"{name:<34}{value:>8}")
+    if results["errors"]:
+        print()
+        print(f"{len(results['errors'])} erreur(s), par exemple :")
+        for session_id, page, message in results["errors"][:5]:
+            print(f"  session {session_id} — {page} : {message}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="sessions simultanées")
+    parser.add_argument("--reruns", type=int, default=20, help="reruns par session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="timeout d'un rerun (s)")
+    parser.add_argument("--json", type=Path, default=None, help="écrit les mesures en JSON")
+    args = parser.parse_args(argv)
+
+    results = run_load_test(args.sessions, args.reruns, args.seed, args.timeout)
+    print_report(results)
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,30 @@
+import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
-import unidecode
 
-
-# =============== OUTIL NOM DE GARE ===============
-
-
-def clean_name(name):
-    """Nettoie un nom de gare pour la jointure."""
-    if not isinstance(name, str):
-        return ""
-    name = name.lower().strip()
-    name = unidecode.unidecode(name)  # enlève accents
-    name = name.replace("(", "").replace(")", "")
-    name = name.replace("-", " ")
-    name = " ".join(name.split())  # supprime espaces multiples
-    return name
+from transport_data import (
+    ARTIFACTS_DIR,
+    GARES_FILE,
+    VALIDATIONS_FILE,
+    DatasetStore,
+    StationIndex,
+    locate_case_insensitive,
+    merge_validations_gares,
+)
+from transport_export import (
+    EXPORT_FORMATS,
+    export_file_name,
+    export_order,
+    prune_exports,
+    prune_exports_every,
+    slug,
+    write_export_chunks,
+)
 
 
 # =============== COULEURS UNIFIÉES ===============
@@ -48,141 +54,25 @@ NEON_SEQUENCE = [
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 
-
-def locate_case_insensitive(name: str) -> Path:
-    """Retourne un Path dans BASE_DIR en ignorant la casse."""
-    p = BASE_DIR / name
-    if p.exists():
-        return p
-    lname = name.lower()
-    for child in BASE_DIR.iterdir():
-        if child.name.lower() == lname:
-            return child
-    return p
-
-
-VALIDATIONS_PATH = locate_case_insensitive(
-    "validations-reseau-ferre-profils-horaires-par-jour-type-1er-trimestre.csv"
-)
-GARES_PATH = locate_case_insensitive(
-    "emplacement-des-gares-idf-data-generalisee.csv"
-)
+VALIDATIONS_PATH = locate_case_insensitive(VALIDATIONS_FILE)
+GARES_PATH = locate_case_insensitive(GARES_FILE)
 
 
 # =============== FONCTIONS DONNÉES TRANSPORT ===============
 
 
-@st.cache_data
-def load_validations_data(path: Path) -> pd.DataFrame:
-    """Charge et prépare les données de profils horaires de validations (réseau ferré)."""
-    df = pd.read_csv(path, sep=";")
-
-    df = df.rename(
-        columns={
-            "libelle_arret": "gare",
-            "cat_jour": "type_jour",
-            "trnc_horr_60": "tranche_horaire",
-            "pourcentage_validations": "pct_validations",
-        }
-    )
-
-    df["pct_validations"] = pd.to_numeric(df["pct_validations"], errors="coerce")
-
-    def parse_heure(tranche):
-        if not isinstance(tranche, str):
-            return None
-        part = tranche.split("-")[0]  # "6H"
-        part = part.replace("H", "")
-        try:
-            return int(part)
-        except ValueError:
-            return None
-
-    df["heure"] = df["tranche_horaire"].apply(parse_heure)
-
-    df = df.dropna(
-        subset=["gare", "type_jour", "tranche_horaire", "pct_validations", "heure"]
-    )
-    df["heure"] = df["heure"].astype(int)
-
-    df["gare"] = df["gare"].apply(clean_name)
-
-    return df
-
-
-@st.cache_data
-def load_gares_data(path: Path) -> pd.DataFrame:
-    """Charge et prépare les données de localisation des gares."""
-    df = pd.read_csv(path, sep=";")
+@st.cache_resource
+def get_dataset_store() -> DatasetStore:
+    """Store unique du processus : rechargé en tâche de fond, partagé par les sessions."""
+    return DatasetStore(BASE_DIR, ARTIFACTS_DIR).start()
 
-    if "nom_long" in df.columns:
-        df = df.rename(columns={"nom_long": "gare"})
 
-    if "geo_point_2d" in df.columns:
-
-        def split_geo(s):
-            if isinstance(s, str):
-                parts = s.split(",")
-                if len(parts) == 2:
-                    return parts[0].strip(), parts[1].strip()
-            return None, None
-
-        df[["lat_str", "lon_str"]] = df["geo_point_2d"].apply(
-            lambda x: pd.Series(split_geo(x))
-        )
-        df["lat"] = pd.to_numeric(df["lat_str"], errors="coerce")
-        df["lon"] = pd.to_numeric(df["lon_str"], errors="coerce")
-
-    for col in ["termetro", "terrer", "tertrain", "tertram", "terval"]:
-        if col not in df.columns:
-            df[col] = 0
-
-    if "mode" not in df.columns:
-
-        def infer_mode(row):
-            if row.get("termetro", 0) == 1:
-                return "Métro"
-            if row.get("terrer", 0) == 1:
-                return "RER"
-            if row.get("tertrain", 0) == 1:
-                return "Train"
-            if row.get("tertram", 0) == 1:
-                return "Tram"
-            if row.get("terval", 0) == 1:
-                return "VAL"
-            return "Autre"
-
-        df["mode"] = df.apply(infer_mode, axis=1)
-
-    keep_cols = [
-        "gare",
-        "lat",
-        "lon",
-        "mode",
-        "exploitant",
-        "termetro",
-        "terrer",
-        "tertrain",
-        "tertram",
-        "terval",
-    ]
-    keep_cols = [c for c in keep_cols if c in df.columns]
-    df = df[keep_cols]
-
-    df = df.dropna(subset=["gare"])
-    df["gare"] = df["gare"].apply(clean_name)
-
-    return df
-
-
-@st.cache_data
-def merge_validations_gares(df_val: pd.DataFrame, df_gares: pd.DataFrame) -> pd.DataFrame:
-    """Jointure entre profils horaires et géolocalisation des gares."""
-    merged = df_val.merge(df_gares, on="gare", how="left")
-    return merged
+# =============== GRAPHIQUES TRANSPORT ===============
 
 
-# =============== GRAPHIQUES TRANSPORT ===============
+# Au-delà de ce nombre de gares, une trace SVG par gare devient trop lente :
+# on bascule sur quelques traces WebGL fusionnées (une par type de jour).
+PROFIL_WEBGL_THRESHOLD = 30
 
 
 def plot_profil_horaire(df: pd.DataFrame) -> None:
@@ -191,6 +81,10 @@ def plot_profil_horaire(df: pd.DataFrame) -> None:
         st.info("Aucune donnée pour ce filtre.")
         return
 
+    if df["gare"].nunique() > PROFIL_WEBGL_THRESHOLD:
+        plot_profil_horaire_webgl(df)
+        return
+
     fig = px.line(
         df.sort_values(["gare", "heure"]),
         x="heure",
@@ -214,6 +108,106 @@ def plot_profil_horaire(df: pd.DataFrame) -> None:
     st.plotly_chart(fig, use_container_width=True)
 
 
+def _gap_separated(df: pd.DataFrame):
+    """Concatène les courbes de chaque gare en une seule série séparée par des NaN."""
+    gares = df["gare"].to_numpy()
+    breaks = np.flatnonzero(gares[1:] != gares[:-1]) + 1
+    x = np.insert(df["heure"].to_numpy(dtype=float), breaks, np.nan)
+    y = np.insert(df["pct_validations"].to_numpy(dtype=float), breaks, np.nan)
+    text = np.insert(gares.astype(object), breaks, None)
+    return x, y, text
+
+
+def add_quantile_band(fig: go.Figure, df: pd.DataFrame, name: str, color: str) -> None:
+    """Ajoute la médiane et l'écart interquartile entre gares, heure par heure."""
+    quantiles = (
+        df.groupby("heure")["pct_validations"]
+        .quantile([0.25, 0.5, 0.75])
+        .unstack()
+        .sort_index()
+    )
+    hours = quantiles.index.to_numpy()
+    r, g, b = (int(color[k : k + 2], 16) for k in (1, 3, 5))
+    fig.add_trace(
+        go.Scatter(
+            x=hours,
+            y=quantiles[0.25],
+            mode="lines",
+            line={"width": 0},
+            legendgroup=name,
+            showlegend=False,
+            hoverinfo="skip",
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=hours,
+            y=quantiles[0.75],
+            mode="lines",
+            line={"width": 0},
+            fill="tonexty",
+            fillcolor=f"rgba({r}, {g}, {b}, 0.18)",
+            legendgroup=name,
+            showlegend=False,
+            hoverinfo="skip",
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=hours,
+            y=quantiles[0.5],
+            mode="lines+markers",
+            line={"width": 3, "color": color},
+            name=f"{name} — médiane (IQR 25–75 %)",
+            legendgroup=name,
+        )
+    )
+
+
+def plot_profil_horaire_webgl(df: pd.DataFrame) -> None:
+    """Profil horaire pour un grand nombre de gares (WebGL + bandes médiane / IQR)."""
+    n_gares = df["gare"].nunique()
+    show_bands = st.checkbox(
+        "Afficher la médiane et l'écart interquartile entre gares", value=True
+    )
+
+    fig = go.Figure()
+    df_sorted = df.sort_values(["type_jour", "gare", "heure"])
+    for i, (type_jour, group) in enumerate(
+        df_sorted.groupby("type_jour", observed=True, sort=True)
+    ):
+        color = NEON_SEQUENCE[i % len(NEON_SEQUENCE)]
+        x, y, text = _gap_separated(group)
+        fig.add_trace(
+            go.Scattergl(
+                x=x,
+                y=y,
+                text=text,
+                mode="lines",
+                name=str(type_jour),
+                legendgroup=str(type_jour),
+                connectgaps=False,
+                opacity=0.35 if show_bands else 0.6,
+                line={"width": 1, "color": color},
+                hovertemplate="%{text}<br>%{x}h : %{y:.2f} %<extra>%{fullData.name}</extra>",
+            )
+        )
+        if show_bands:
+            # Une bande par type de jour : semaine et week-end ne sont pas mélangés
+            add_quantile_band(fig, group, str(type_jour), color)
+
+    fig.update_xaxes(dtick=1, title="Heure de la journée")
+    fig.update_yaxes(title="% des validations journalières")
+    fig.update_layout(
+        title=f"Profil horaire des validations ({n_gares} gares, rendu WebGL)",
+        template="plotly_dark",
+        plot_bgcolor="#050816",
+        paper_bgcolor="#050816",
+        legend_title_text="Type de jour",
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
 def plot_boxplot(df: pd.DataFrame) -> None:
     """Boxplot : distribution des validations par mode de transport."""
     df_plot = df.dropna(subset=["mode"]).copy()
@@ -249,17 +243,17 @@ def plot_boxplot(df: pd.DataFrame) -> None:
     st.plotly_chart(fig, use_container_width=True)
 
 
-def plot_heatmap(df: pd.DataFrame) -> None:
-    """Heatmap : heure × type de jour."""
-    if df.empty:
-        return
-
-    pivot = (
-        df.groupby(["type_jour", "heure"])["pct_validations"]
-        .mean()
-        .reset_index()
-        .pivot(index="type_jour", columns="heure", values="pct_validations")
-    )
+def plot_heatmap(df: pd.DataFrame, pivot: pd.DataFrame = None) -> None:
+    """Heatmap : heure × type de jour (pivot précalculé si fourni)."""
+    if pivot is None:
+        if df.empty:
+            return
+        pivot = (
+            df.groupby(["type_jour", "heure"], observed=True)["pct_validations"]
+            .mean()
+            .reset_index()
+            .pivot(index="type_jour", columns="heure", values="pct_validations")
+        )
 
     fig = px.imshow(
         pivot,
@@ -314,6 +308,121 @@ def show_map(df_merged: pd.DataFrame) -> None:
     st.plotly_chart(fig, use_container_width=True)
 
 
+# =============== SÉLECTION DES GARES ===============
+
+
+SEARCH_TOP_K = 20
+PICKER_KEY = "gares_selection"
+
+
+def _add_group(groups: dict, widget_key: str) -> None:
+    """Callback : ajoute toutes les gares du groupe choisi puis réinitialise le choix."""
+    choice = st.session_state[widget_key]
+    if choice:
+        selection = st.session_state[PICKER_KEY]
+        st.session_state[PICKER_KEY] = selection + [
+            g for g in groups[choice] if g not in selection
+        ]
+    st.session_state[widget_key] = ""
+
+
+def station_picker(index: StationIndex, default: list) -> list:
+    """Picker de gares : recherche indexée (top-k par pertinence) et ajout par mode / ligne.
+
+    Seules la sélection courante et les SEARCH_TOP_K meilleures correspondances
+    sont envoyées au navigateur, quel que soit le nombre de gares du réseau.
+    """
+    if PICKER_KEY not in st.session_state:
+        st.session_state[PICKER_KEY] = list(default)
+
+    col_search, col_mode, col_line = st.columns([2, 1, 1])
+    with col_search:
+        query = st.text_input(
+            "Rechercher une gare",
+            placeholder="ex. chatelet, gare de lyon, saint lazare…",
+            help=(
+                f"Les {SEARCH_TOP_K} premières gares correspondant à la recherche : "
+                "nom commençant par la saisie d'abord, puis ordre alphabétique."
+            ),
+        )
+    with col_mode:
+        st.selectbox(
+            "Ajouter toutes les gares d'un mode",
+            [""] + list(index.by_mode),
+            key="ajout_mode",
+            on_change=_add_group,
+            args=(index.by_mode, "ajout_mode"),
+        )
+    with col_line:
+        st.selectbox(
+            "Ajouter toutes les gares d'une ligne",
+            [""] + list(index.by_line),
+            key="ajout_ligne",
+            on_change=_add_group,
+            args=(index.by_line, "ajout_ligne"),
+        )
+
+    selection = st.session_state[PICKER_KEY]
+    matches = index.search(query, k=SEARCH_TOP_K)
+    options = selection + [g for g in matches if g not in selection]
+    return st.multiselect("Gares / stations à afficher", options, key=PICKER_KEY)
+
+
+# =============== EXPORT DONNÉES FILTRÉES ===============
+
+
+# Servi tel quel par Streamlit (server.enableStaticServing) : le fichier est
+# lu par blocs depuis le disque, sans passer par la mémoire du serveur.
+EXPORT_DIR = BASE_DIR / "static" / "exports"
+EXPORT_URL = "app/static/exports"
+
+
+def show_export(
+    df_filtered: pd.DataFrame,
+    selected_trimestre: str,
+    selected_type_jour: str,
+    selected_gares: list,
+    plage_horaire: tuple,
+    data_version: str,
+) -> None:
+    """Export CSV / Parquet de la sélection courante, servi depuis le disque."""
+    col_fmt, col_btn = st.columns([1, 2], vertical_alignment="bottom")
+    with col_fmt:
+        fmt = st.radio("Format d'export", list(EXPORT_FORMATS), horizontal=True)
+    ext = EXPORT_FORMATS[fmt]
+    file_name = export_file_name(
+        selected_trimestre, selected_type_jour, selected_gares, plage_horaire, ext
+    )
+    # Un sous-dossier par version des données : pas d'export périmé
+    version_part = slug(data_version) or "courante"
+    path = EXPORT_DIR / version_part / file_name
+    # Rétention appliquée même sans nouvel export (limité à un passage par minute)
+    prune_exports_every(EXPORT_DIR, version_part)
+
+    with col_btn:
+        slot = st.empty()
+        if not path.exists():
+            # Fichier écrit seulement à la demande, par blocs
+            if not slot.button(
+                f"⚙️ Préparer l'export ({fmt})",
+                disabled=df_filtered.empty,
+                use_container_width=True,
+            ):
+                return
+            # Tri par positions : seul le bloc en cours d'écriture est copié
+            write_export_chunks(df_filtered, path, ext, order=export_order(df_filtered))
+            prune_exports(EXPORT_DIR, version_part)
+        try:
+            os.utime(path)  # repousse l'expiration tant que le lien est affiché
+        except FileNotFoundError:
+            return
+        slot.markdown(
+            f"<a href='{EXPORT_URL}/{version_part}/{file_name}' download='{file_name}'>"
+            f"⬇️ Télécharger la sélection ({fmt})</a>",
+            unsafe_allow_html=True,
+        )
+
+
 # =============== PAGE DASHBOARD (LAYOUT NORMAL) ===============
 
 
@@ -334,7 +443,8 @@ et les **coordonnées géographiques des gares** pour analyser :
         """
     )
 
-    if not VALIDATIONS_PATH.exists() or not GARES_PATH.exists():
+    snapshot = get_dataset_store().snapshot()
+    if snapshot is None:
         if not VALIDATIONS_PATH.exists():
             st.error(
                 "Fichier des profils horaires introuvable. "
@@ -348,9 +458,20 @@ et les **coordonnées géographiques des gares** pour analyser :
             )
         return
 
-    df_val = load_validations_data(VALIDATIONS_PATH)
-    df_gares = load_gares_data(GARES_PATH)
-    df_merged = merge_validations_gares(df_val, df_gares)
+    # Un fichier de validations par trimestre : on en affiche un à la fois
+    trimestres = list(snapshot["trimestres"])
+    if len(trimestres) > 1:
+        selected_trimestre = st.selectbox(
+            "Trimestre", trimestres, index=len(trimestres) - 1
+        )
+    else:
+        selected_trimestre = trimestres[0]
+
+    df_val = snapshot["trimestres"][selected_trimestre]["df_val"]
+    aggregates = snapshot["trimestres"][selected_trimestre]["aggregates"]
+    df_gares = snapshot["df_gares"]
+    station_join = snapshot["station_join"]
+    data_version = snapshot["version"]
 
     with st.expander("Aperçu des données et préparation", expanded=False):
         col1, col2 = st.columns(2)
@@ -366,12 +487,8 @@ et les **coordonnées géographiques des gares** pour analyser :
     type_jour_options = ["Tous"] + sorted(df_val["type_jour"].unique())
     selected_type_jour = st.selectbox("Type de jour", type_jour_options, index=0)
 
-    gares_dispo = sorted(df_merged.dropna(subset=["mode"])["gare"].unique())
-    selected_gares = st.multiselect(
-        "Gares / stations à afficher",
-        gares_dispo,
-        default=gares_dispo[:5],
-    )
+    gares_dispo = aggregates["gares_dispo"]
+    selected_gares = station_picker(snapshot["search_index"], gares_dispo[:5])
 
     min_h = int(df_val["heure"].min())
     max_h = int(df_val["heure"].max())
@@ -382,21 +499,17 @@ et les **coordonnées géographiques des gares** pour analyser :
         value=(min_h, max_h),
     )
 
-    df_filtered = df_val.copy()
+    # Filtres combinés en un seul masque : df_val (partagé, mappé) n'est pas copié
+    heures = df_val["heure"].to_numpy()
+    mask = (heures >= plage_horaire[0]) & (heures <= plage_horaire[1])
     if selected_type_jour != "Tous":
-        df_filtered = df_filtered[df_filtered["type_jour"] == selected_type_jour]
+        mask &= (df_val["type_jour"] == selected_type_jour).to_numpy()
     if selected_gares:
-        df_filtered = df_filtered[df_filtered["gare"].isin(selected_gares)]
-    df_filtered = df_filtered[
-        (df_filtered["heure"] >= plage_horaire[0])
-        & (df_filtered["heure"] <= plage_horaire[1])
-    ]
-
-    df_merged_filtered = df_merged.merge(
-        df_filtered[["gare", "type_jour", "heure", "pct_validations"]],
-        on=["gare", "type_jour", "heure", "pct_validations"],
-        how="inner",
-    )
+        mask &= df_val["gare"].isin(selected_gares).to_numpy()
+    df_filtered = df_val if mask.all() else df_val[mask]
+
+    # Jointure avec les gares limitée aux lignes filtrées
+    df_merged_filtered = merge_validations_gares(df_filtered, df_gares, station_join)
 
     colk1, colk2, colk3 = st.columns(3)
     with colk1:
@@ -424,7 +537,11 @@ et les **coordonnées géographiques des gares** pour analyser :
 
     st.markdown("### 3. Heatmap validations par heure et type de jour")
     if selected_type_jour == "Tous":
-        plot_heatmap(df_filtered)
+        full_range = plage_horaire == (min_h, max_h)
+        if not selected_gares and full_range:
+            plot_heatmap(df_filtered, pivot=aggregates["heatmap"])
+        else:
+            plot_heatmap(df_filtered)
     else:
         st.info(
             "Pour afficher la heatmap complète, sélectionne **Tous** dans le filtre 'Type de jour'."
@@ -443,6 +560,14 @@ et les **coordonnées géographiques des gares** pour analyser :
         df_filtered.sort_values(["gare", "heure"]),
         use_container_width=True,
     )
+    show_export(
+        df_filtered,
+        selected_trimestre,
+        selected_type_jour,
+        selected_gares,
+        plage_horaire,
+        data_version,
+    )
 
     st.markdown("### Synthèse des enseignements")
     st.write(
@@ -1,13 +1,19 @@
+import io
 from pathlib import Path
 
 import pandas as pd
 import plotly.express as px
 import streamlit as st
+from PIL import Image, ImageOps
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 PHOTO_PATH = BASE_DIR / "photo.jpg"
 PDF_PATH = BASE_DIR / "CV_Aziz_Djerbi.pdf"
 
+# Largeur d'affichage de la photo (colonne 1/4), doublée pour les écrans HiDPI
+PHOTO_DISPLAY_WIDTH = 360
+PHOTO_RENDER_WIDTH = 2 * PHOTO_DISPLAY_WIDTH
+
 NEON_SEQUENCE = [
     "#00F5D4",
     "#F97316",
@@ -18,6 +24,52 @@ NEON_SEQUENCE = [
 ]
 
 
+# =============== ASSETS (CACHE PARTAGÉ) ===============
+
+
+def asset_version(path: Path) -> int:
+    """Version d'un asset = mtime en ns (0 si absent) : sert de clé de cache."""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+@st.cache_resource(max_entries=4)
+def load_asset_bytes(path: str, version: int) -> bytes:
+    """Lit un fichier une seule fois par version ; buffer partagé entre sessions."""
+    return Path(path).read_bytes()
+
+
+@st.cache_resource(max_entries=4)
+def load_photo_variant(path: str, version: int, width: int) -> bytes:
+    """Photo redimensionnée à `width` px, en JPEG.
+
+    L'original (plusieurs Mo) est lu directement et n'est pas gardé en cache :
+    seule la variante réduite reste en mémoire. Le JPEG est servi tel quel
+    par st.image (un autre format serait ré-encodé à chaque rerun).
+    """
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        if img.width > width:
+            height = round(img.height * width / img.width)
+            img = img.resize((width, height), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=85, optimize=True)
+    return out.getvalue()
+
+
+def show_photo(caption: str) -> None:
+    """Affiche la photo depuis le cache, sans lecture disque ni ré-encodage."""
+    st.image(
+        load_photo_variant(
+            str(PHOTO_PATH), asset_version(PHOTO_PATH), PHOTO_RENDER_WIDTH
+        ),
+        caption=caption,
+        use_container_width=True,
+    )
+
+
 def show_cv() -> None:
     # En-tête type "carte" CV
     with st.container(border=True):
@@ -25,11 +77,7 @@ def show_cv() -> None:
 
         with left:
             if PHOTO_PATH.exists():
-                st.image(
-                    PHOTO_PATH,
-                    caption="Aziz DJERBI",
-                    use_container_width=True,
-                )
+                show_photo("Aziz DJERBI")
             else:
                 st.warning(
                     "Photo introuvable. Place **photo.jpg** (ou .jpeg/.png) à côté de `app.py`."
@@ -44,9 +92,10 @@ def show_cv() -> None:
             col_btn1, col_btn2 = st.columns([1, 2])
             with col_btn1:
                 if PDF_PATH.exists():
+                    pdf_version = asset_version(PDF_PATH)
                     st.download_button(
                         "📄 Télécharger le CV",
-                        PDF_PATH.read_bytes(),
+                        lambda: load_asset_bytes(str(PDF_PATH), pdf_version),
                         file_name=PDF_PATH.name,
                         mime="application/pdf",
                         use_container_width=True,
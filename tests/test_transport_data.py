@@ -0,0 +1,380 @@
+"""Tests des données transport : jointure, artefacts et rechargement à chaud."""
+
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import transport_data
+from transport_data import (
+    GARES_FILE,
+    VALIDATIONS_PREFIX,
+    DatasetStore,
+    StationIndex,
+    build_artifacts,
+    load_artifacts,
+    merge_validations_gares,
+    station_join,
+)
+
+T1 = f"{VALIDATIONS_PREFIX}1er-trimestre.csv"
+T2 = f"{VALIDATIONS_PREFIX}2eme-trimestre.csv"
+
+VALIDATIONS_HEADER = "libelle_arret;cat_jour;trnc_horr_60;pourcentage_validations"
+GARES_HEADER = "geo_point_2d;nom_long;res_com;mode;exploitant"
+
+
+def write_validations(path, gares=("ABBESSES", "CHATELET"), pct=4.0):
+    lines = [VALIDATIONS_HEADER]
+    for gare in gares:
+        for jour in ("JOHV", "SAHV"):
+            for h in range(24):
+                lines.append(f"{gare};{jour};{h}H-{h + 1}H;{pct}")
+    write(path, "\n".join(lines) + "\n")
+
+
+def write_gares(path, lat=48.88):
+    write(
+        path,
+        f"{GARES_HEADER}\n"
+        f"{lat}, 2.33;Abbesses;METRO 12;METRO;RATP\n"
+        "48.86, 2.34;Châtelet;METRO 1 / METRO 4;METRO;RATP\n",
+    )
+
+
+def write(path, text):
+    # Force un changement de signature même si la taille est identique
+    previous = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(previous + 10**9, previous + 10**9))
+
+
+# =============== JOINTURE ET ARTEFACTS ===============
+
+
+GARES = pd.DataFrame(
+    {
+        "gare": ["abbesses", "chatelet", "chatelet", "nation"],
+        "mode": ["Métro", "Métro", "RER", "RER"],
+        "lat": [48.88, 48.86, 48.86, 48.85],
+    }
+)
+
+
+def facts(gares):
+    return pd.DataFrame(
+        {
+            "gare": gares,
+            "heure": np.arange(len(gares)),
+            "pct_validations": np.linspace(1, 2, len(gares)),
+        }
+    )
+
+
+def pandas_merge(df_val, df_gares):
+    return df_val.astype({"gare": str}).merge(df_gares, on="gare", how="left")
+
+
+@pytest.mark.parametrize(
+    "join", [None, "build"], ids=["index-calcule", "index-du-build"]
+)
+def test_join_matches_pandas_merge(join):
+    # chatelet : deux lignes dans le référentiel ; inconnue : absente
+    df_val = facts(["chatelet", "inconnue", "abbesses", "chatelet", "inconnue"])
+    if join == "build":
+        keys = pd.Index(["abbesses", "chatelet", "inconnue", "nation", "zoo"])
+        join = (keys, *station_join(keys, GARES))
+
+    got = merge_validations_gares(df_val, GARES, join)
+
+    pd.testing.assert_frame_equal(got, pandas_merge(df_val, GARES))
+
+
+def test_join_categorical_with_foreign_categories():
+    # Catégories hors des clés du référentiel, et une gare manquante (NaN)
+    gare = pd.Categorical(
+        ["nation", "zoo", None, "chatelet"],
+        categories=["zoo", "chatelet", "autre", "nation"],
+    )
+    df_val = facts(gare)
+
+    got = merge_validations_gares(df_val, GARES)
+
+    expected = pandas_merge(df_val.dropna(subset=["gare"]), GARES)
+    observed = got.dropna(subset=["gare"]).astype({"gare": str}).reset_index(drop=True)
+    pd.testing.assert_frame_equal(observed, expected)
+    assert got["gare"].isna().sum() == 1
+    assert got.loc[got["gare"].isna(), ["mode", "lat"]].isna().all().all()
+    assert len(got) == len(df_val) + 1  # chatelet dupliquée
+
+
+def test_join_empty_selection():
+    got = merge_validations_gares(facts([]), GARES)
+    assert got.empty
+    assert list(got.columns) == ["gare", "heure", "pct_validations", "mode", "lat"]
+
+
+def is_mapped(array) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+def test_build_load_round_trip_keeps_memmap(data_dir):
+    build_artifacts(data_dir / T1, data_dir / GARES_FILE, data_dir / "artifacts")
+    df_val, df_gares, agg, join = load_artifacts(data_dir / "artifacts")
+
+    assert len(df_val) == 2 * 2 * 24
+    assert set(df_val["gare"].astype(str)) == {"abbesses", "chatelet"}
+    for col in ("pct_validations", "heure"):
+        assert is_mapped(df_val[col].to_numpy()), col
+    for col in ("gare", "type_jour", "tranche_horaire"):
+        assert is_mapped(df_val[col].array.codes), col
+    assert all(is_mapped(a) for a in join[1:])
+
+    # La jointure du build donne le même résultat que la fusion pandas
+    got = merge_validations_gares(df_val, df_gares, join)
+    expected = pandas_merge(df_val, df_gares)
+    pd.testing.assert_frame_equal(
+        got.astype({"gare": str}), expected, check_categorical=False
+    )
+
+
+# =============== RECHARGEMENT À CHAUD ===============
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_validations(tmp_path / T1)
+    write_gares(tmp_path / GARES_FILE)
+    return tmp_path
+
+
+@pytest.fixture
+def store(data_dir):
+    store = DatasetStore(data_dir, data_dir / "artifacts", poll_interval=0)
+    assert store.refresh()
+    return store
+
+
+def df_val(store, trimestre="1er trimestre"):
+    return store.snapshot()["trimestres"][trimestre]["df_val"]
+
+
+def test_initial_snapshot(store):
+    snapshot = store.snapshot()
+    assert list(snapshot["trimestres"]) == ["1er trimestre"]
+    assert len(df_val(store)) == 2 * 2 * 24
+    assert snapshot["aggregates"]["gares_dispo"] == ["abbesses", "chatelet"]
+
+
+def test_unchanged_sources_keep_snapshot(store):
+    snapshot = store.snapshot()
+    assert not store.refresh()
+    assert store.snapshot() is snapshot
+
+
+def test_new_quarter_reuses_existing_partitions(store, data_dir):
+    before = dict(store._partitions)
+    write_validations(data_dir / T2, gares=("ABBESSES",))
+
+    assert store.refresh()
+    assert store._partitions[f"validations:{T1}"] is before[f"validations:{T1}"]
+    assert store._partitions["gares"] is before["gares"]
+    # Chaque trimestre reste une table à part : pas de doublon (gare, jour, heure)
+    assert list(store.snapshot()["trimestres"]) == ["1er trimestre", "2eme trimestre"]
+    for trimestre in ("1er trimestre", "2eme trimestre"):
+        df = df_val(store, trimestre)
+        assert not df.duplicated(["gare", "type_jour", "heure"]).any()
+    assert len(df_val(store, "2eme trimestre")) == 1 * 2 * 24
+
+
+def test_background_poll_publishes_new_quarter(data_dir):
+    store = DatasetStore(data_dir, data_dir / "artifacts", poll_interval=0.01)
+    try:
+        snapshot = store.start().snapshot()
+        assert snapshot is not None
+        write_validations(data_dir / T2, gares=("ABBESSES",))
+
+        deadline = time.monotonic() + 5
+        while store.snapshot() is snapshot and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "2eme trimestre" in store.snapshot()["trimestres"]
+    finally:
+        store.stop()
+
+
+def test_snapshot_does_not_reload(store, data_dir):
+    # La lecture ne fait jamais le travail du thread de fond
+    snapshot = store.snapshot()
+    write_validations(data_dir / T2, gares=("ABBESSES",))
+    assert store.snapshot() is snapshot
+
+
+def test_stats_count_reused_and_ingested_partitions(store, data_dir):
+    write_validations(data_dir / T2, gares=("ABBESSES",))
+    store.refresh()
+    store.refresh()
+
+    assert store.stats["refreshes"] == 3
+    assert store.stats["unchanged"] == 1
+    assert store.stats["publishes"] == 2
+    assert store.stats["partitions_ingested_csv"] == 3  # T1 + gares, puis T2
+    assert store.stats["partitions_reused"] == 2  # T1 + gares au 2e passage
+
+
+def test_changed_station_file(store, data_dir):
+    before = dict(store._partitions)
+    write_gares(data_dir / GARES_FILE, lat=48.9)
+
+    assert store.refresh()
+    snapshot = store.snapshot()
+    assert store._partitions[f"validations:{T1}"] is before[f"validations:{T1}"]
+    lat = snapshot["df_gares"].set_index("gare").loc["abbesses", "lat"]
+    assert lat == pytest.approx(48.9)
+
+
+def test_deleted_quarter(store, data_dir):
+    write_validations(data_dir / T2, gares=("ABBESSES",))
+    store.refresh()
+    (data_dir / T2).unlink()
+
+    assert store.refresh()
+    assert list(store.snapshot()["trimestres"]) == ["1er trimestre"]
+    assert f"validations:{T2}" not in store._partitions
+
+
+def test_deleted_station_file(store, data_dir):
+    (data_dir / GARES_FILE).unlink()
+
+    assert store.refresh()
+    assert store.snapshot() is None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "",  # fichier vide (copie à peine commencée)
+        "libelle_arret;cat_jour;trn",  # en-tête tronqué
+    ],
+    ids=["vide", "tronque"],
+)
+def test_malformed_file_keeps_previous_snapshot(store, data_dir, caplog, content):
+    snapshot = store.snapshot()
+    write(data_dir / T1, content)
+
+    with caplog.at_level(logging.WARNING, logger="transport_data"):
+        assert not store.refresh()
+    assert store.snapshot() is snapshot
+    assert T1 in caplog.text
+
+    # Même signature : pas de nouvel essai
+    caplog.clear()
+    store._state = None  # force la comparaison des partitions
+    with caplog.at_level(logging.WARNING, logger="transport_data"):
+        assert not store.refresh()
+    assert caplog.text == ""
+
+    # Copie terminée : la partition est réingérée
+    write_validations(data_dir / T1, pct=5.0)
+    assert store.refresh()
+    assert (df_val(store)["pct_validations"] == 5.0).all()
+
+
+def test_malformed_new_quarter_is_skipped(store, data_dir, caplog):
+    snapshot = store.snapshot()
+    write(data_dir / T2, "")
+
+    with caplog.at_level(logging.WARNING, logger="transport_data"):
+        assert not store.refresh()
+    assert store.snapshot() is snapshot
+    assert T2 in caplog.text
+
+
+@pytest.fixture
+def built_store(data_dir):
+    build_artifacts(data_dir / T1, data_dir / GARES_FILE, data_dir / "artifacts")
+    store = DatasetStore(data_dir, data_dir / "artifacts", poll_interval=0)
+    assert store.refresh()
+    return store
+
+
+def sources_used(store):
+    return {key: part["signature"][0] for key, part in store._partitions.items()}
+
+
+def test_artifacts_survive_touch(built_store, data_dir):
+    assert set(sources_used(built_store).values()) == {"artifacts"}
+    assert built_store.stats["partitions_ingested_artifacts"] == 2
+    assert built_store.stats["partitions_ingested_csv"] == 0
+    for name in (T1, GARES_FILE):
+        write(data_dir / name, (data_dir / name).read_text(encoding="utf-8"))
+
+    built_store.refresh()
+    assert set(sources_used(built_store).values()) == {"artifacts"}
+
+
+def test_artifacts_fallback_on_same_size_edit(built_store, data_dir):
+    write_validations(data_dir / T1, pct=5.0)  # même taille, contenu différent
+
+    assert built_store.refresh()
+    assert sources_used(built_store) == {
+        "gares": "artifacts",
+        f"validations:{T1}": "csv",
+    }
+    assert (df_val(built_store)["pct_validations"] == 5.0).all()
+
+
+def test_artifacts_reuse_built_aggregates(data_dir, monkeypatch):
+    build_artifacts(data_dir / T1, data_dir / GARES_FILE, data_dir / "artifacts")
+    csv_store = DatasetStore(data_dir, data_dir / "csv-only", poll_interval=0)
+    csv_store.refresh()
+    expected = csv_store.snapshot()["aggregates"]
+
+    def fail(df):
+        raise AssertionError("faits reparcourus au chargement du build")
+
+    # Partitions couvertes par le build : aucun agrégat recalculé sur les faits
+    monkeypatch.setattr(transport_data, "partition_aggregates", fail)
+    store = DatasetStore(data_dir, data_dir / "artifacts", poll_interval=0)
+    store.refresh()
+    aggregates = store.snapshot()["aggregates"]
+
+    assert aggregates["gares_dispo"] == expected["gares_dispo"]
+    pd.testing.assert_frame_equal(aggregates["heatmap"], expected["heatmap"])
+
+
+def test_artifacts_with_custom_source_names(tmp_path):
+    # python transport_data.py build --validations val.csv --gares gares.csv
+    src, app_dir = tmp_path / "src", tmp_path / "app"
+    src.mkdir()
+    app_dir.mkdir()
+    write_validations(src / "val.csv")
+    write_gares(src / "gares.csv")
+    build_artifacts(src / "val.csv", src / "gares.csv", app_dir / "artifacts")
+
+    store = DatasetStore(app_dir, app_dir / "artifacts", poll_interval=0)
+    store.refresh()
+    snapshot = store.snapshot()
+    assert snapshot is not None
+    assert sources_used(store) == {
+        "gares": "artifacts",
+        "validations:val.csv": "artifacts",
+    }
+    assert list(snapshot["trimestres"]) == ["val"]
+    assert len(df_val(store, "val")) == 2 * 2 * 24
+    assert snapshot["aggregates"]["gares_dispo"] == ["abbesses", "chatelet"]
+
+
+def test_search_ranks_by_relevance_then_name():
+    gares = ["gare de lyon", "lyon bercy", "la garenne", "gare du nord", "massy"]
+    index = StationIndex(pd.DataFrame({"gare": gares}), gares)
+
+    assert index.search("gare") == ["gare de lyon", "gare du nord", "la garenne"]
+    assert index.search("lyon") == ["lyon bercy", "gare de lyon"]
+    assert index.search("") == sorted(gares)
@@ -0,0 +1,140 @@
+"""Tests de l'export des données filtrées (noms, écriture par blocs, rétention)."""
+
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from transport_export import (
+    export_file_name,
+    export_order,
+    prune_exports,
+    prune_exports_every,
+    write_export_chunks,
+)
+
+
+def make_df():
+    gares = ["gare du nord", "abbesses", "chatelet", "abbesses", "gare du nord"]
+    return pd.DataFrame(
+        {
+            "gare": pd.Categorical(
+                gares, categories=["zoo", "gare du nord", "chatelet", "abbesses"]
+            ),
+            "type_jour": pd.Categorical(["JOHV", "SAHV", "JOHV", "JOHV", "SAHV"]),
+            "heure": [8, 9, 7, 6, 5],
+            "pct_validations": [1.5, 2.0, 3.25, 4.0, 0.5],
+        }
+    )
+
+
+# =============== NOMS DE FICHIERS ===============
+
+
+def test_file_name_encodes_filters():
+    name = export_file_name(
+        "1er trimestre", "JOHV", ["Châtelet", "Gare de l'Est"], (6, 20), "csv"
+    )
+    assert name == "validations_1er-trimestre_johv_chatelet_gare-de-l-est_6h-20h.csv"
+
+
+def test_file_name_is_path_safe():
+    gares = ["../../etc/passwd", "a b/c"]
+    name = export_file_name("../..", "Tous", gares, (0, 23), "csv")
+    assert "/" not in name and ".." not in name
+    assert name == "validations_donnees_tous_etc-passwd_a-b-c_0h-23h.csv"
+
+
+def test_file_name_many_stations_uses_stable_digest():
+    gares = ["a", "b", "c", "d"]
+    first = export_file_name("t1", "JOHV", gares, (0, 23), "parquet")
+    assert first == export_file_name("t1", "JOHV", gares[::-1], (0, 23), "parquet")
+    assert "_4-gares-" in first
+    other = export_file_name("t1", "JOHV", gares[:3] + ["e"], (0, 23), "parquet")
+    assert first != other
+
+
+# =============== ÉCRITURE PAR BLOCS ===============
+
+
+def test_export_order_matches_sort_values():
+    df = make_df()
+    expected = (
+        df.astype({"gare": str}).sort_values(["gare", "heure"], kind="stable").index
+    )
+    assert list(export_order(df)) == list(expected)
+
+
+@pytest.mark.parametrize("ext", ["csv", "parquet"])
+def test_chunked_round_trip(tmp_path, ext):
+    df = make_df()
+    order = export_order(df)
+    path = write_export_chunks(
+        df, tmp_path / f"export.{ext}", ext, order=order, chunk_rows=2
+    )
+
+    if ext == "csv":
+        back = pd.read_csv(path, sep=";")
+        expected = df.iloc[order].astype({"gare": str, "type_jour": str})
+    else:
+        back = pd.read_parquet(path)
+        expected = df.iloc[order]
+        assert isinstance(back["gare"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(
+        back,
+        expected.reset_index(drop=True),
+        check_dtype=False,
+        check_categorical=False,
+    )
+    assert list(tmp_path.iterdir()) == [path]  # pas de fichier temporaire restant
+
+
+def test_empty_csv_export_keeps_header(tmp_path):
+    path = write_export_chunks(make_df().iloc[:0], tmp_path / "vide.csv", "csv")
+    header = path.read_text(encoding="utf-8").strip()
+    assert header == "gare;type_jour;heure;pct_validations"
+
+
+# =============== RÉTENTION ===============
+
+
+def touch(path, age_s):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("x")
+    mtime = time.time() - age_s
+    os.utime(path, (mtime, mtime))
+
+
+def test_prune_ttl_max_files_and_old_versions(tmp_path):
+    touch(tmp_path / "ancienne" / "a.csv", 0)
+    for i in range(5):
+        touch(tmp_path / "v1" / f"{i}.csv", i * 10)
+    touch(tmp_path / "v1" / "expire.csv", 7200)
+
+    prune_exports(tmp_path, "v1", ttl_s=3600, max_files=3)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["v1"]
+    assert sorted(p.name for p in (tmp_path / "v1").iterdir()) == [
+        "0.csv",
+        "1.csv",
+        "2.csv",
+    ]
+
+
+def test_prune_every_is_rate_limited(tmp_path):
+    touch(tmp_path / "v1" / "expire.csv", 7200)
+    assert prune_exports_every(tmp_path, "v1", interval_s=60, ttl_s=3600)
+    assert not (tmp_path / "v1" / "expire.csv").exists()
+
+    # Dans l'intervalle : aucun passage, même si un fichier a expiré
+    touch(tmp_path / "v1" / "expire.csv", 7200)
+    assert not prune_exports_every(tmp_path, "v1", interval_s=60, ttl_s=3600)
+    assert (tmp_path / "v1" / "expire.csv").exists()
+    assert prune_exports_every(tmp_path, "v1", interval_s=0, ttl_s=3600)
+    assert not (tmp_path / "v1" / "expire.csv").exists()
+
+
+def test_prune_missing_dir(tmp_path):
+    prune_exports(tmp_path / "absent", "v1")
+    assert not (tmp_path / "absent").exists()
@@ -0,0 +1,871 @@
+"""Préparation des données transport et artefacts précalculés (hors Streamlit).
+
+Construction des artefacts versionnés (à lancer après chaque nouveau CSV) :
+
+    python transport_data.py build
+    python transport_data.py build --validations chemin.csv --gares chemin.csv --out artifacts
+
+Chaque build écrit `artifacts/<version>/` (tableaux NumPy `.npy` + fichiers Arrow
+IPC + `manifest.json`), puis met à jour `artifacts/CURRENT` de façon atomique.
+Le dashboard mappe ces fichiers en mémoire au démarrage (`load_artifacts`).
+
+En cours d'exécution, `DatasetStore` surveille les CSV posés à côté de `app.py`
+(un fichier de validations par trimestre + le référentiel des gares) et ne
+réingère que la partition modifiée.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import unidecode
+
+BASE_DIR = Path(__file__).resolve().parent
+ARTIFACTS_DIR = BASE_DIR / "artifacts"
+ARTIFACTS_FORMAT = 6
+
+VALIDATIONS_FILE = "validations-reseau-ferre-profils-horaires-par-jour-type-1er-trimestre.csv"
+VALIDATIONS_PREFIX = "validations-reseau-ferre-profils-horaires-par-jour-type-"
+GARES_FILE = "emplacement-des-gares-idf-data-generalisee.csv"
+
+logger = logging.getLogger(__name__)
+
+
+# =============== OUTIL NOM DE GARE ===============
+
+
+def clean_name(name):
+    """Nettoie un nom de gare pour la jointure."""
+    if not isinstance(name, str):
+        return ""
+    name = name.lower().strip()
+    name = unidecode.unidecode(name)  # enlève accents
+    name = name.replace("(", "").replace(")", "")
+    name = name.replace("-", " ")
+    name = " ".join(name.split())  # supprime espaces multiples
+    return name
+
+
+def locate_case_insensitive(name: str, base_dir: Path = BASE_DIR) -> Path:
+    """Retourne un Path dans base_dir en ignorant la casse."""
+    p = base_dir / name
+    if p.exists():
+        return p
+    lname = name.lower()
+    for child in base_dir.iterdir():
+        if child.name.lower() == lname:
+            return child
+    return p
+
+
+# =============== PRÉPARATION DES DONNÉES ===============
+
+
+def prepare_validations(path: Path) -> pd.DataFrame:
+    """Charge et prépare les données de profils horaires de validations (réseau ferré)."""
+    df = pd.read_csv(path, sep=";")
+
+    df = df.rename(
+        columns={
+            "libelle_arret": "gare",
+            "cat_jour": "type_jour",
+            "trnc_horr_60": "tranche_horaire",
+            "pourcentage_validations": "pct_validations",
+        }
+    )
+
+    df["pct_validations"] = pd.to_numeric(df["pct_validations"], errors="coerce")
+
+    def parse_heure(tranche):
+        if not isinstance(tranche, str):
+            return None
+        part = tranche.split("-")[0]  # "6H"
+        part = part.replace("H", "")
+        try:
+            return int(part)
+        except ValueError:
+            return None
+
+    df["heure"] = df["tranche_horaire"].apply(parse_heure)
+
+    df = df.dropna(
+        subset=["gare", "type_jour", "tranche_horaire", "pct_validations", "heure"]
+    )
+    df["heure"] = df["heure"].astype(int)
+
+    df["gare"] = df["gare"].apply(clean_name)
+
+    return df
+
+
+def prepare_gares(path: Path) -> pd.DataFrame:
+    """Charge et prépare les données de localisation des gares."""
+    df = pd.read_csv(path, sep=";")
+
+    if "nom_long" in df.columns:
+        df = df.rename(columns={"nom_long": "gare"})
+
+    if "geo_point_2d" in df.columns:
+
+        def split_geo(s):
+            if isinstance(s, str):
+                parts = s.split(",")
+                if len(parts) == 2:
+                    return parts[0].strip(), parts[1].strip()
+            return None, None
+
+        df[["lat_str", "lon_str"]] = df["geo_point_2d"].apply(
+            lambda x: pd.Series(split_geo(x))
+        )
+        df["lat"] = pd.to_numeric(df["lat_str"], errors="coerce")
+        df["lon"] = pd.to_numeric(df["lon_str"], errors="coerce")
+
+    for col in ["termetro", "terrer", "tertrain", "tertram", "terval"]:
+        if col not in df.columns:
+            df[col] = 0
+
+    if "mode" not in df.columns:
+
+        def infer_mode(row):
+            if row.get("termetro", 0) == 1:
+                return "Métro"
+            if row.get("terrer", 0) == 1:
+                return "RER"
+            if row.get("tertrain", 0) == 1:
+                return "Train"
+            if row.get("tertram", 0) == 1:
+                return "Tram"
+            if row.get("terval", 0) == 1:
+                return "VAL"
+            return "Autre"
+
+        df["mode"] = df.apply(infer_mode, axis=1)
+
+    keep_cols = [
+        "gare",
+        "lat",
+        "lon",
+        "mode",
+        "exploitant",
+        "res_com",
+        "termetro",
+        "terrer",
+        "tertrain",
+        "tertram",
+        "terval",
+    ]
+    keep_cols = [c for c in keep_cols if c in df.columns]
+    df = df[keep_cols]
+
+    df = df.dropna(subset=["gare"])
+    df["gare"] = df["gare"].apply(clean_name)
+
+    return df
+
+
+def station_join(keys: pd.Index, df_gares: pd.DataFrame):
+    """Index de jointure gare -> lignes de df_gares, au format CSR (ptr, rows).
+
+    Les lignes du référentiel pour la clé `keys[i]` sont `rows[ptr[i]:ptr[i + 1]]` :
+    une gare peut en avoir plusieurs (une par mode) ou aucune.
+    """
+    codes = keys.get_indexer(df_gares["gare"])
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    counts = np.bincount(codes[order], minlength=len(keys))
+    ptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+    return ptr, order.astype(np.int32)
+
+
+def _station_codes(gare: pd.Series, keys: pd.Index) -> np.ndarray:
+    """Position de chaque gare dans keys (-1 si absente), sans matérialiser les noms."""
+    if isinstance(gare.dtype, pd.CategoricalDtype):
+        lookup = np.append(keys.get_indexer(gare.cat.categories), -1)
+        return lookup[gare.array.codes]  # code -1 (NaN) -> dernier élément, -1
+    return keys.get_indexer(gare)
+
+
+def merge_validations_gares(
+    df_val: pd.DataFrame, df_gares: pd.DataFrame, join=None
+) -> pd.DataFrame:
+    """Jointure (gauche) entre profils horaires et géolocalisation des gares.
+
+    `join` = (keys, ptr, rows), calculé au build (voir `station_join`) : seules
+    les lignes de df_val passées en argument sont jointes, sans fusion pandas
+    sur toute la table.
+    """
+    if join is None:
+        keys = pd.Index(sorted(set(df_gares["gare"])))
+        join = (keys, *station_join(keys, df_gares))
+    keys, ptr, rows = join
+
+    codes = _station_codes(df_val["gare"], keys)
+    found = codes >= 0
+    safe = np.where(found, codes, 0)
+    counts = np.where(found, ptr[safe + 1] - ptr[safe], 0)
+    reps = np.maximum(counts, 1)  # gare sans coordonnées : une ligne avec NaN
+
+    fact_pos = np.repeat(np.arange(len(df_val)), reps)
+    offset = np.arange(len(fact_pos)) - np.repeat(np.cumsum(reps) - reps, reps)
+    matched = np.repeat(counts > 0, reps)
+    rows_ext = np.append(rows, -1)
+    gare_rows = rows_ext[np.where(matched, np.repeat(ptr[safe], reps) + offset, len(rows))]
+
+    left = df_val.iloc[fact_pos].reset_index(drop=True)
+    right = (
+        df_gares.drop(columns="gare")
+        .reset_index(drop=True)
+        .reindex(gare_rows)
+        .reset_index(drop=True)
+    )
+    return pd.concat([left, right], axis=1)
+
+
+def partition_aggregates(df_val: pd.DataFrame) -> dict:
+    """Gares présentes, sommes et effectifs d'une partition, combinables entre partitions."""
+    heat = df_val.groupby(["type_jour", "heure"], observed=True)["pct_validations"]
+    return {
+        "gares": df_val.groupby("gare", observed=True).size().index.astype(str),
+        "heat_sum": heat.sum(),
+        "heat_count": heat.count(),
+    }
+
+
+def combine_aggregates(parts: list, df_gares: pd.DataFrame) -> dict:
+    """Agrégats globaux à partir des agrégats de chaque partition (sans relire les faits)."""
+
+    def total(key):
+        series = [p[key] for p in parts]
+        levels = list(range(series[0].index.nlevels))
+        return pd.concat(series).groupby(level=levels, observed=True).sum()
+
+    gares = set().union(*(p["gares"] for p in parts))
+    heat_mean = total("heat_sum") / total("heat_count")
+    heatmap = (
+        heat_mean.rename("pct_validations")
+        .reset_index()
+        .astype({"type_jour": str})
+        .pivot(index="type_jour", columns="heure", values="pct_validations")
+    )
+    gares_with_mode = set(df_gares.dropna(subset=["mode"])["gare"])
+    return {
+        "gares_dispo": sorted(gares & gares_with_mode),
+        "heatmap": heatmap,
+    }
+
+
+# =============== RECHERCHE DE GARES ===============
+
+
+class StationIndex:
+    """Index de recherche des gares (trigrammes + préfixes de mots).
+
+    Les jeux de données ne donnent que des parts horaires (% des validations
+    de la journée de chaque gare), pas de volumes : les résultats sont donc
+    classés par pertinence (nom qui commence par la requête, puis mots qui
+    commencent par chaque terme, puis simple inclusion), à égalité par ordre
+    alphabétique. Les identifiants sont les rangs alphabétiques des gares.
+    """
+
+    def __init__(self, df_gares: pd.DataFrame, gares: list):
+        self.names = sorted(gares)
+        rank = {name: i for i, name in enumerate(self.names)}
+
+        trigrams, prefixes = {}, {}
+        for i, name in enumerate(self.names):
+            for tri in {name[j : j + 3] for j in range(len(name) - 2)}:
+                trigrams.setdefault(tri, []).append(i)
+            for word in name.split():
+                for p in {word[:1], word[:2]}:
+                    prefixes.setdefault(p, set()).add(i)
+        self._trigrams = {t: np.array(ids, dtype=np.int32) for t, ids in trigrams.items()}
+        self._prefixes = {
+            p: np.array(sorted(ids), dtype=np.int32) for p, ids in prefixes.items()
+        }
+
+        # Sélection groupée : gares par mode et par ligne (res_com), triées par nom
+        self.by_mode = self._group(df_gares, "mode", rank)
+        self.by_line = self._group(df_gares, "res_com", rank)
+
+    def _group(self, df_gares: pd.DataFrame, col: str, rank: dict) -> dict:
+        if col not in df_gares.columns:
+            return {}
+        groups = {}
+        for values, gare in df_gares[[col, "gare"]].dropna().itertuples(index=False):
+            if gare not in rank:
+                continue
+            # Correspondances : "METRO 1 / METRO 11" compte pour chaque ligne
+            for value in str(values).split(" / "):
+                groups.setdefault(value.strip(), set()).add(rank[gare])
+        return {
+            value: [self.names[i] for i in sorted(ids)]
+            for value, ids in sorted(groups.items())
+        }
+
+    def _postings(self, token: str):
+        if len(token) < 3:
+            return self._prefixes.get(token, np.empty(0, dtype=np.int32))
+        lists = [
+            self._trigrams.get(token[j : j + 3], np.empty(0, dtype=np.int32))
+            for j in range(len(token) - 2)
+        ]
+        lists.sort(key=len)
+        ids = lists[0]
+        for other in lists[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        return ids
+
+    def search(self, query: str, k: int = 20) -> list:
+        """k gares les plus pertinentes contenant tous les mots de la requête.
+
+        La recherche ignore les accents et la casse.
+        """
+        cleaned = clean_name(query)
+        tokens = cleaned.split()
+        if not tokens:
+            return self.names[:k]
+
+        postings = sorted((self._postings(t) for t in tokens), key=len)
+        ids = postings[0]
+        for other in postings[1:]:
+            ids = np.intersect1d(ids, other, assume_unique=True)
+
+        # Les trigrammes ne garantissent pas la contiguïté : vérification finale
+        scored = []
+        for i in ids:
+            name = self.names[i]
+            words = name.split()
+            if not all(
+                (t in name) if len(t) >= 3 else any(w.startswith(t) for w in words)
+                for t in tokens
+            ):
+                continue
+            if name.startswith(cleaned):
+                score = 0
+            elif all(any(w.startswith(t) for w in words) for t in tokens):
+                score = 1
+            else:
+                score = 2
+            scored.append((score, i))
+        # Ids croissants = ordre alphabétique : tri stable par score seulement
+        scored.sort(key=lambda item: item[0])
+        return [self.names[i] for _, i in scored[:k]]
+
+
+# =============== ARTEFACTS VERSIONNÉS ===============
+
+
+def partition_key(path: Path) -> str:
+    """Clé de partition d'un fichier découvert : "gares" ou "validations:<nom>"."""
+    if path.name.lower() == GARES_FILE:
+        return "gares"
+    return f"validations:{path.name}"
+
+
+def partition_label(key: str) -> str:
+    """Libellé d'une partition de validations : "1er trimestre", "2eme trimestre"..."""
+    name = key.split(":", 1)[1]
+    stem = name[: -len(".csv")] if name.lower().endswith(".csv") else name
+    if stem.lower().startswith(VALIDATIONS_PREFIX):
+        stem = stem[len(VALIDATIONS_PREFIX) :]
+    return stem.replace("-", " ").strip() or name
+
+
+def file_signature(path: Path):
+    """(mtime_ns, taille) d'un fichier, ou None s'il n'existe pas."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _source_entry(path: Path) -> dict:
+    mtime_ns, size = file_signature(path)
+    return {
+        "name": path.name,
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "digest": _file_digest([path]),
+    }
+
+
+def discover_sources(base_dir: Path = BASE_DIR) -> dict:
+    """Fichiers sources présents dans base_dir, par clé de partition."""
+    sources = {}
+    for child in sorted(base_dir.iterdir()):
+        lname = child.name.lower()
+        if lname == GARES_FILE or (
+            lname.startswith(VALIDATIONS_PREFIX) and lname.endswith(".csv")
+        ):
+            sources[partition_key(child)] = child
+    return sources
+
+
+def _file_digest(paths) -> str:
+    h = hashlib.sha1(f"format={ARTIFACTS_FORMAT}".encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:12]
+
+
+def _write_arrow(df: pd.DataFrame, path: Path) -> None:
+    # Fichier IPC non compressé : lisible par memory map sans copie
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_arrow(path: Path) -> pd.DataFrame:
+    with pa.memory_map(str(path), "r") as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def current_version(out_dir: Path = ARTIFACTS_DIR):
+    """Version pointée par out_dir/CURRENT, ou None si aucun build."""
+    try:
+        return (out_dir / "CURRENT").read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _set_current(out_dir: Path, version: str) -> None:
+    tmp = out_dir / f"CURRENT.{uuid.uuid4().hex}.tmp"
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, out_dir / "CURRENT")
+
+
+def build_artifacts(
+    validations_path: Path,
+    gares_path: Path,
+    out_dir: Path = ARTIFACTS_DIR,
+    force: bool = False,
+) -> str:
+    """Construit les artefacts à partir des CSV bruts et retourne leur version."""
+    version = _file_digest([validations_path, gares_path])
+    final_dir = out_dir / version
+    if final_dir.exists() and not force:
+        _set_current(out_dir, version)
+        return version
+
+    df_val = prepare_validations(validations_path)
+    df_gares = prepare_gares(gares_path)
+    agg = partition_aggregates(df_val)
+
+    # Clés de gare normalisées : union validations + référentiel, triée
+    keys = pd.Index(sorted(set(df_val["gare"]) | set(df_gares["gare"])))
+    type_jour = pd.Categorical(df_val["type_jour"].astype(str))
+    tranche = pd.Categorical(df_val["tranche_horaire"].astype(str))
+    gare = pd.Categorical(df_val["gare"], categories=keys)
+
+    tmp_dir = out_dir / f".build-{uuid.uuid4().hex}"
+    tmp_dir.mkdir(parents=True)
+    try:
+        np.save(tmp_dir / "fact_gare.npy", gare.codes)
+        np.save(tmp_dir / "fact_type_jour.npy", type_jour.codes)
+        np.save(tmp_dir / "fact_tranche.npy", tranche.codes)
+        np.save(tmp_dir / "fact_heure.npy", df_val["heure"].to_numpy(np.int64))
+        np.save(
+            tmp_dir / "fact_pct.npy", df_val["pct_validations"].to_numpy(np.float64)
+        )
+        _write_arrow(pd.DataFrame({"gare": keys}), tmp_dir / "station_keys.arrow")
+        _write_arrow(df_gares, tmp_dir / "stations.arrow")
+        # Jointure faits -> référentiel, indexée par les codes de fact_gare
+        join_ptr, join_rows = station_join(keys, df_gares)
+        np.save(tmp_dir / "join_ptr.npy", join_ptr)
+        np.save(tmp_dir / "join_rows.npy", join_rows)
+
+        # Agrégats de la partition : relus tels quels au chargement, sans
+        # reparcourir les faits
+        gares_codes = keys.get_indexer(agg["gares"]).astype(np.int32)
+        np.save(tmp_dir / "agg_gares.npy", gares_codes)
+        np.save(tmp_dir / "agg_heat_sum.npy", agg["heat_sum"].to_numpy(np.float64))
+        np.save(tmp_dir / "agg_heat_count.npy", agg["heat_count"].to_numpy(np.int64))
+
+        manifest = {
+            "format": ARTIFACTS_FORMAT,
+            "version": version,
+            # Clés fixées par le rôle du fichier, pas par son nom (--gares chemin.csv)
+            "sources": {
+                partition_key(validations_path): _source_entry(validations_path),
+                "gares": _source_entry(gares_path),
+            },
+            "rows": len(df_val),
+            "stations": len(keys),
+            "type_jour": list(type_jour.categories),
+            "tranche_horaire": list(tranche.categories),
+            "heat_index": [[str(t), int(h)] for t, h in agg["heat_sum"].index],
+        }
+        (tmp_dir / "manifest.json").write_text(
+            json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+
+        if final_dir.exists():
+            shutil.rmtree(final_dir)
+        os.replace(tmp_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _set_current(out_dir, version)
+    return version
+
+
+def read_manifest(out_dir: Path = ARTIFACTS_DIR, version=None) -> dict:
+    """Manifest d'un build (par défaut celui pointé par CURRENT)."""
+    version = version or current_version(out_dir)
+    if version is None:
+        raise FileNotFoundError(f"Aucun artefact dans {out_dir}")
+    path = out_dir / version / "manifest.json"
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def load_artifacts(out_dir: Path = ARTIFACTS_DIR, version=None):
+    """Mappe en mémoire un build : retourne (df_val, df_gares, agg, join).
+
+    Les colonnes numériques restent adossées aux fichiers `.npy` (mmap en
+    lecture seule) et les colonnes texte sont des catégories sur des codes
+    entiers compacts, eux aussi mappés : plusieurs processus partagent le
+    page cache et le démarrage ne reparse plus les CSV. `agg` contient les
+    agrégats de la partition (comme `partition_aggregates`) lus depuis le
+    build, et `join` l'index de jointure avec le référentiel (voir
+    `merge_validations_gares`).
+    """
+    manifest = read_manifest(out_dir, version)
+    vdir = out_dir / manifest["version"]
+    if manifest["format"] != ARTIFACTS_FORMAT:
+        raise ValueError(
+            f"Format d'artefact {manifest['format']} incompatible "
+            f"(attendu {ARTIFACTS_FORMAT}) : relancer `python transport_data.py build`."
+        )
+
+    def npy(name):
+        return np.load(vdir / f"{name}.npy", mmap_mode="r")
+
+    def categorical(name, categories):
+        # Codes écrits par le build : pas de validation, qui relirait tout le fichier
+        dtype = pd.CategoricalDtype(categories)
+        return pd.Categorical.from_codes(npy(name), dtype=dtype, validate=False)
+
+    keys = pd.Index(_read_arrow(vdir / "station_keys.arrow")["gare"])
+    df_val = pd.DataFrame(
+        {
+            "gare": categorical("fact_gare", keys),
+            "type_jour": categorical("fact_type_jour", manifest["type_jour"]),
+            "tranche_horaire": categorical("fact_tranche", manifest["tranche_horaire"]),
+            "pct_validations": npy("fact_pct"),
+            "heure": npy("fact_heure"),
+        },
+        copy=False,
+    )
+    df_gares = _read_arrow(vdir / "stations.arrow")
+
+    heat_index = pd.MultiIndex.from_tuples(
+        [tuple(pair) for pair in manifest["heat_index"]], names=["type_jour", "heure"]
+    )
+    agg = {
+        "gares": keys[npy("agg_gares")],
+        "heat_sum": pd.Series(npy("agg_heat_sum"), index=heat_index, copy=False),
+        "heat_count": pd.Series(npy("agg_heat_count"), index=heat_index, copy=False),
+    }
+    join = (keys, npy("join_ptr"), npy("join_rows"))
+    return df_val, df_gares, agg, join
+
+
+# =============== RECHARGEMENT À CHAUD ===============
+
+
+class DatasetStore:
+    """Jeu de données courant, rechargé partition par partition à chaud.
+
+    `snapshot()` retourne un dict immuable (version, trimestres, df_gares,
+    station_join, aggregates, search_index), où `trimestres` associe à chaque
+    fichier de validations son libellé, sa table et ses agrégats : les
+    trimestres ne sont jamais concaténés.
+
+    `start()` fait le premier chargement puis lance un thread de fond qui,
+    toutes les `poll_interval` secondes, compare la signature (mtime, taille)
+    des CSV et le build d'artefacts courant. Seules les partitions modifiées
+    sont réingérées, puis le nouvel instantané remplace l'ancien en une
+    affectation : `snapshot()` ne fait que lire cette référence, et aucune
+    session n'attend un rechargement.
+
+    Un fichier illisible (en cours de copie, vide, tronqué) est journalisé et
+    ignoré : la partition précédente reste en place et l'ingestion n'est
+    retentée que lorsque sa signature change.
+
+    `stats` compte les vérifications, partitions réutilisées ou réingérées
+    (depuis le build ou les CSV), échecs et publications, pour le test de
+    charge.
+    """
+
+    def __init__(
+        self,
+        base_dir: Path = BASE_DIR,
+        artifacts_dir: Path = ARTIFACTS_DIR,
+        poll_interval: float = 5.0,
+    ):
+        self.base_dir = base_dir
+        self.artifacts_dir = artifacts_dir
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._state = None  # (signatures, version d'artefacts)
+        self._artifacts = None  # build courant : version, manifest, tables, agg, join
+        self._partitions = {}  # clé -> {"signature", "df", "agg" ou "join"}
+        self._failed = {}  # clé -> signature dont l'ingestion a échoué
+        self._checked = {}  # clé -> (version, signature, artefact valable)
+        self._current = None
+        self.stats = Counter()
+
+    def start(self) -> "DatasetStore":
+        """Premier chargement (bloquant), puis surveillance en tâche de fond."""
+        self.refresh()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._poll, name="dataset-store-poll", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Arrête le thread de surveillance."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:
+                # Le thread doit survivre à une erreur imprévue (disque, build...)
+                logger.exception("Échec du rechargement des données transport")
+
+    def snapshot(self):
+        """Instantané courant (None si aucune donnée) ; ne déclenche aucun chargement."""
+        return self._current
+
+    def refresh(self) -> bool:
+        """Recharge les partitions modifiées ; True si un nouvel instantané a été publié."""
+        with self._lock:
+            self.stats["refreshes"] += 1
+            sources = discover_sources(self.base_dir)
+            signatures = {key: file_signature(path) for key, path in sources.items()}
+            state = (signatures, current_version(self.artifacts_dir))
+            if state == self._state:
+                self.stats["unchanged"] += 1
+                return False
+
+            self._load_artifacts(state[1])
+            partitions = self._collect_partitions(sources, signatures)
+            self._state = state
+            published = self._publish(partitions)
+            self.stats["publishes"] += published
+            return published
+
+    def _load_artifacts(self, version) -> None:
+        if version is None:
+            self._artifacts = None
+            return
+        if self._artifacts is not None and self._artifacts["version"] == version:
+            return
+        try:
+            manifest = read_manifest(self.artifacts_dir, version)
+            df_val, df_gares, agg, join = load_artifacts(self.artifacts_dir, version)
+        except (FileNotFoundError, ValueError, KeyError):
+            # Build incomplet ou d'un ancien format : on retombe sur les CSV
+            self._artifacts = None
+            return
+        self._artifacts = {
+            "version": version,
+            "manifest": manifest,
+            "df_val": df_val,
+            "df_gares": df_gares,
+            "agg": agg,
+            "join": join,
+        }
+
+    def _from_artifacts(self, key: str, signature, path):
+        """DataFrame de la partition `key` si le build courant la couvre encore."""
+        if self._artifacts is None:
+            return None
+        version = self._artifacts["version"]
+        entry = self._artifacts["manifest"]["sources"].get(key)
+        if entry is None:
+            return None
+        # Source absente (déploiement sans CSV) ou identique au build : artefact valable
+        if signature is not None and signature != (entry["mtime_ns"], entry["size"]):
+            checked = self._checked.get(key)
+            if checked is None or checked[:2] != (version, signature):
+                checked = (version, signature, self._same_content(entry, signature, path))
+                self._checked[key] = checked
+            if not checked[2]:
+                return None
+        return self._artifacts["df_gares" if key == "gares" else "df_val"]
+
+    def _same_content(self, entry: dict, signature, path: Path) -> bool:
+        """Compare au build une source dont seul le mtime a changé (touch, git, cp)."""
+        if signature[1] == entry["size"] and entry.get("digest"):
+            if _file_digest([path]) == entry["digest"]:
+                logger.info("%s : mtime modifié, contenu identique au build", path.name)
+                return True
+        logger.info("%s : modifié depuis le build, rechargement depuis le CSV", path.name)
+        return False
+
+    def _collect_partitions(self, sources: dict, signatures: dict) -> dict:
+        keys = set(sources)
+        if self._artifacts is not None:
+            keys |= set(self._artifacts["manifest"]["sources"])
+
+        partitions = {}
+        for key in sorted(keys):
+            signature = signatures.get(key)
+            df = self._from_artifacts(key, signature, sources.get(key))
+            if df is not None:
+                tag = ("artifacts", self._artifacts["version"])
+            elif signature is not None:
+                tag = ("csv", signature)
+            else:
+                continue  # fichier supprimé et non couvert par le build
+
+            previous = self._partitions.get(key)
+            if previous is not None and previous["signature"] == tag:
+                partitions[key] = previous
+                self.stats["partitions_reused"] += 1
+                continue
+            if self._failed.get(key) == tag:
+                # Déjà en échec avec cette signature : on attend une modification
+                if previous is not None:
+                    partitions[key] = previous
+                    self.stats["partitions_reused"] += 1
+                continue
+
+            try:
+                partitions[key] = self._ingest(key, tag, df, sources.get(key))
+            except Exception:
+                # Un fichier déposé à la main peut lever n'importe quoi : on le
+                # signale sans interrompre les sessions, l'ancienne version reste
+                logger.warning(
+                    "Partition %s ignorée (%s), nouvel essai au prochain changement",
+                    key,
+                    sources.get(key),
+                    exc_info=True,
+                )
+                self._failed[key] = tag
+                self.stats["partitions_failed"] += 1
+                if previous is not None:
+                    partitions[key] = previous
+            else:
+                self._failed.pop(key, None)
+                self.stats[f"partitions_ingested_{tag[0]}"] += 1
+        return partitions
+
+    def _ingest(self, key: str, tag, df, path) -> dict:
+        # Partition couverte par le build : tables, agrégats et jointure sont
+        # relus tels quels ; seules les partitions venues des CSV sont calculées
+        if tag[0] == "artifacts":
+            if key == "gares":
+                return {"signature": tag, "df": df, "join": self._artifacts["join"]}
+            return {"signature": tag, "df": df, "agg": self._artifacts["agg"]}
+
+        if key == "gares":
+            df = prepare_gares(path)
+            keys = pd.Index(sorted(set(df["gare"])))
+            return {"signature": tag, "df": df, "join": (keys, *station_join(keys, df))}
+        df = prepare_validations(path)
+        return {"signature": tag, "df": df, "agg": partition_aggregates(df)}
+
+    def _publish(self, partitions: dict) -> bool:
+        if partitions.keys() == self._partitions.keys() and all(
+            partitions[k] is self._partitions[k] for k in partitions
+        ):
+            return False  # rien n'a été réingéré : l'instantané courant reste valable
+
+        gares = partitions.get("gares")
+        val_keys = [k for k in partitions if k != "gares"]
+        if gares is None or not val_keys:
+            self._partitions = partitions
+            self._current = None
+            return True
+
+        df_gares = gares["df"]
+        version = hashlib.sha1(
+            repr(sorted((k, p["signature"]) for k, p in partitions.items())).encode()
+        ).hexdigest()[:12]
+        aggregates = combine_aggregates(
+            [partitions[k]["agg"] for k in val_keys], df_gares
+        )
+        # Un trimestre par fichier, affiché séparément : une même (gare, type
+        # de jour, heure) n'apparaît qu'une fois par table
+        trimestres = {
+            partition_label(k): {
+                "df_val": partitions[k]["df"],
+                "aggregates": combine_aggregates([partitions[k]["agg"]], df_gares),
+            }
+            for k in sorted(val_keys)
+        }
+        snapshot = {
+            "version": version,
+            "trimestres": trimestres,
+            "df_gares": df_gares,
+            "station_join": gares["join"],
+            "aggregates": aggregates,
+            "search_index": StationIndex(df_gares, aggregates["gares_dispo"]),
+        }
+
+        self._partitions = partitions
+        self._current = snapshot  # publication atomique (une seule affectation)
+        return True
+
+
+# =============== LIGNE DE COMMANDE ===============
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="construit les artefacts à partir des CSV")
+    build.add_argument("--validations", type=Path, default=None)
+    build.add_argument("--gares", type=Path, default=None)
+    build.add_argument("--out", type=Path, default=ARTIFACTS_DIR)
+    build.add_argument(
+        "--force", action="store_true", help="reconstruit même si la version existe"
+    )
+
+    args = parser.parse_args(argv)
+
+    validations_path = args.validations or locate_case_insensitive(VALIDATIONS_FILE)
+    gares_path = args.gares or locate_case_insensitive(GARES_FILE)
+    for path in (validations_path, gares_path):
+        if not path.exists():
+            print(f"Fichier introuvable : {path}", file=sys.stderr)
+            return 1
+
+    version = build_artifacts(validations_path, gares_path, args.out, force=args.force)
+    print(f"Artefacts {version} écrits dans {args.out / version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Export des données filtrées du dashboard transport (hors Streamlit).
+
+Les fichiers sont écrits par blocs dans `<dossier d'export>/<version>/`, puis
+servis depuis le disque par Streamlit (`server.enableStaticServing`). Les
+exports des anciennes versions, expirés ou en surnombre sont supprimés par
+`prune_exports`, appelé au plus une fois par intervalle via
+`prune_exports_every`.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from transport_data import clean_name
+
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_TTL_S = 3600
+EXPORT_MAX_FILES = 200
+EXPORT_PRUNE_INTERVAL_S = 60
+EXPORT_FORMATS = {"CSV": "csv", "Parquet": "parquet"}
+
+
+# =============== NOMS DE FICHIERS ===============
+
+
+def slug(text: str, max_len: int = 40) -> str:
+    """Réduit un libellé à [a-z0-9-] pour l'utiliser dans un chemin ou une URL."""
+    return re.sub(r"[^a-z0-9]+", "-", clean_name(text)).strip("-")[:max_len].strip("-")
+
+
+def export_file_name(
+    trimestre: str, type_jour: str, gares: list, plage_horaire: tuple, ext: str
+) -> str:
+    """Encode l'état des filtres dans le nom du fichier exporté."""
+    trimestre_part = slug(trimestre) or "donnees"
+    jour_part = slug(type_jour) or "tous"
+    if not gares:
+        gares_part = "toutes-gares"
+    elif len(gares) <= 3:
+        gares_part = "_".join(slug(g) or "gare" for g in sorted(gares))
+    else:
+        # Trop de gares pour le nom : nombre + empreinte stable de la sélection
+        digest = hashlib.sha1("|".join(sorted(gares)).encode("utf-8")).hexdigest()[:8]
+        gares_part = f"{len(gares)}-gares-{digest}"
+    heures_part = f"{int(plage_horaire[0])}h-{int(plage_horaire[1])}h"
+    return f"validations_{trimestre_part}_{jour_part}_{gares_part}_{heures_part}.{ext}"
+
+
+# =============== ÉCRITURE PAR BLOCS ===============
+
+
+def _sort_codes(values: pd.Series) -> np.ndarray:
+    """Rangs entiers donnant l'ordre de tri de values (valeurs manquantes en dernier)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        rank = np.empty(len(categories) + 1, dtype=np.int64)
+        rank[categories.argsort()] = np.arange(len(categories))
+        rank[-1] = len(categories)  # code -1 (NaN) -> après toutes les catégories
+        return rank[values.array.codes]
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.to_numpy()  # lexsort place déjà les NaN en dernier
+    codes, _ = pd.factorize(values, sort=True)
+    return np.where(codes >= 0, codes, codes.max(initial=-1) + 1)
+
+
+def export_order(df: pd.DataFrame, by=("gare", "heure")) -> np.ndarray:
+    """Positions de df triées selon `by`, sans copier le tableau."""
+    # np.lexsort trie d'abord sur la dernière clé fournie
+    return np.lexsort([_sort_codes(df[col]) for col in reversed(by)])
+
+
+def write_export_chunks(
+    df: pd.DataFrame,
+    path: Path,
+    ext: str,
+    order: np.ndarray = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Path:
+    """Écrit df sur disque par blocs de chunk_rows lignes (CSV ou Parquet).
+
+    `order` (voir `export_order`) donne l'ordre des lignes : seul le bloc en
+    cours est matérialisé.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+
+    def chunk(start):
+        if order is None:
+            return df.iloc[start : start + chunk_rows]
+        return df.iloc[order[start : start + chunk_rows]]
+
+    try:
+        if ext == "csv":
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                for start in range(0, max(len(df), 1), chunk_rows):
+                    chunk(start).to_csv(f, sep=";", index=False, header=start == 0)
+        else:
+            schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for start in range(0, len(df), chunk_rows):
+                    writer.write_table(
+                        pa.Table.from_pandas(
+                            chunk(start), schema=schema, preserve_index=False
+                        )
+                    )
+
+        # Remplacement atomique : un export concurrent ne lit jamais un fichier partiel
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+# =============== RÉTENTION ===============
+
+
+def prune_exports(
+    export_dir: Path,
+    data_version: str,
+    ttl_s: float = EXPORT_TTL_S,
+    max_files: int = EXPORT_MAX_FILES,
+) -> None:
+    """Supprime les exports des anciennes versions, expirés ou en surnombre."""
+    if not export_dir.is_dir():
+        return
+    for version_dir in export_dir.iterdir():
+        if version_dir.is_dir() and version_dir.name != data_version:
+            shutil.rmtree(version_dir, ignore_errors=True)
+
+    current = export_dir / data_version
+    if not current.is_dir():
+        return
+    files = []
+    for path in current.iterdir():
+        try:
+            files.append((path.stat().st_mtime, path))
+        except FileNotFoundError:  # supprimé entre-temps par une autre session
+            continue
+    files.sort(reverse=True)
+
+    now = time.time()
+    for rank, (mtime, path) in enumerate(files):
+        if rank >= max_files or now - mtime > ttl_s:
+            path.unlink(missing_ok=True)
+
+
+_last_prune = {}  # dossier d'export -> instant (monotonic) du dernier nettoyage
+_prune_lock = threading.Lock()
+
+
+def prune_exports_every(
+    export_dir: Path,
+    data_version: str,
+    interval_s: float = EXPORT_PRUNE_INTERVAL_S,
+    **kwargs,
+) -> bool:
+    """`prune_exports` au plus une fois par `interval_s` secondes et par dossier.
+
+    Appelé à chaque affichage du bloc d'export : les fichiers expirés
+    disparaissent même quand plus aucun export n'est créé.
+    """
+    now = time.monotonic()
+    with _prune_lock:
+        last = _last_prune.get(export_dir)
+        if last is not None and now - last < interval_s:
+            return False
+        _last_prune[export_dir] = now
+    prune_exports(export_dir, data_version, **kwargs)
+    return True